@@ -4,7 +4,12 @@
 import os
 import sys
 import base64
+import hashlib
+import json
 import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
 from pathlib import Path
 from email.utils import parseaddr
 
@@ -17,21 +22,68 @@ except ImportError:
 
 from supabase import create_client
 from google import genai
+from google.genai import types
 
 # Add parent directory to path so we can import from talking/utils.py
 sys.path.insert(0, str(Path(__file__).parent.parent / "talking"))
 
-from utils import get_gmail_service, get_supabase_client, get_gemini_client, log
+from utils import (
+    get_gmail_service, get_supabase_client, get_candidates_table, get_gemini_client,
+    fetch_messages_full, extract_headers, log,
+)
 
 load_dotenv()
 
 # --- Configuration ---
 GMAIL_QUERY = "label:Applications is:unread"
 DOWNLOADS_DIR = Path(__file__).parent / "downloads"
+SUPABASE_CHUNK_SIZE = 100  # Max emails per IN filter / rows per insert
+INSERT_FLUSH_SIZE = 50  # Write pending candidates once this many are queued
+MAX_WORKERS = 8  # Concurrent emails in flight, well under Gmail's per-user quota
+RESUME_CACHE_SIZE = 256  # Parsed resumes kept in memory, keyed by file hash
+# Gemini caps inline requests at 20MB. Base64 inflates by 4/3, so keep 1MB for
+# the prompt and size the raw bytes to fit (~14.25MB)
+INLINE_PDF_MAX_BYTES = (20 - 1) * 1024 * 1024 * 3 // 4
+RESUME_PDF_PROMPT = "Extract all text content from this resume PDF. Return the full text in a clean, readable format."
+# Bounded, deterministic JSON output: {"text": "..."}
+RESUME_EXTRACTION_CONFIG = {
+    "response_mime_type": "application/json",
+    "response_schema": {
+        "type": "object",
+        "properties": {"text": {"type": "string"}},
+        "required": ["text"],
+    },
+    "max_output_tokens": 8192,
+    "temperature": 0.0,
+}
+
+# --- Precompiled patterns ---
+_SUBJECT_RE = re.compile(
+    r"^(?P<title>.+?)\s+candidate\s+-\s+(?:(?P<name>.+?)\s+applied\s+via\s+Betterteam)?",
+    re.IGNORECASE,
+)
+_SAFE_NAME_RE = re.compile(r"[^\w\-_.]")
+_LIKE_SPECIAL_RE = re.compile(r"([\\%_])")
+# Opening of a {"text": "..."} response, capturing the (possibly truncated) string body
+_PARTIAL_TEXT_RE = re.compile(r'^\s*\{\s*"text"\s*:\s*"(.*)', re.DOTALL)
+# Common patterns in Betterteam emails:
+# "Email: candidate@example.com"
+# "email: candidate@example.com"
+# "E-mail: candidate@example.com"
+_BODY_EMAIL_RES = [
+    re.compile(r"[Ee]-?mail:\s*([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})"),
+    re.compile(r"Email Address:\s*([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})"),
+    # Generic email pattern - find any email that's not betterteam/noreply
+    re.compile(r"([a-zA-Z0-9._%+-]+@(?!betterteam|noreply)[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})"),
+]
 
 # Get Gemini client (will be initialized when needed)
 _gemini_client = None
 
+# sha256 of resume bytes -> extracted text, so duplicates and retries skip Gemini
+_resume_cache: dict[str, str] = {}
+_resume_cache_lock = threading.Lock()
+
 
 def get_gemini():
     """Lazy-load the Gemini client."""
@@ -47,60 +99,44 @@ def fetch_unread_emails(gmail):
     return result.get("messages", [])
 
 
-def get_sender(gmail, msg_id):
-    msg = gmail.users().messages().get(
-        userId="me", id=msg_id, format="metadata", metadataHeaders=["From"]
-    ).execute()
-    from_header = next(
-        (h["value"] for h in msg["payload"]["headers"] if h["name"] == "From"), ""
-    )
+def fetch_message_full(gmail, msg_id) -> dict:
+    """Fetch a single message with headers, body and attachment ids in one call."""
+    return gmail.users().messages().get(userId="me", id=msg_id, format="full").execute()
+
+
+def get_sender(headers):
+    from_header = headers.get("from", "")
     name, email = parseaddr(from_header)
     return email, name or "Unknown"
 
 
-def get_email_subject(gmail, msg_id) -> str:
-    """Extract the subject line from an email."""
-    msg = gmail.users().messages().get(
-        userId="me", id=msg_id, format="metadata", metadataHeaders=["Subject"]
-    ).execute()
-    subject = next(
-        (h["value"] for h in msg["payload"]["headers"] if h["name"] == "Subject"), ""
-    )
-    return subject
+def get_email_subject(headers) -> str:
+    """Extract the subject line from an email's headers."""
+    return headers.get("subject", "")
 
 
-def parse_job_title_from_subject(subject: str) -> str | None:
-    """Extract job title from Betterteam format: '[Job Title] candidate - [Name] applied via Betterteam'"""
-    if not subject:
-        return None
-    
-    # Use regex to handle variable spacing around "candidate - "
-    match = re.match(r"^(.+?)\s+candidate\s+-\s+", subject, re.IGNORECASE)
-    
-    if match:
-        return match.group(1).strip()
+def parse_subject(subject: str) -> tuple[str | None, str | None]:
+    """
+    Extract (job title, candidate name) from Betterteam format:
+    '[Job Title] candidate - [Name] applied via Betterteam'
     
-    return None
-
-
-def parse_name_from_subject(subject: str) -> str | None:
-    """Extract candidate name from Betterteam format: '[Job Title] candidate - [Name] applied via Betterteam'"""
+    The name is None when the "applied via Betterteam" suffix is missing.
+    """
     if not subject:
-        return None
+        return None, None
     
-    # Match: "... candidate - [Name] applied via Betterteam"
-    match = re.search(r"candidate\s+-\s+(.+?)\s+applied\s+via\s+Betterteam", subject, re.IGNORECASE)
+    # Single pass; regex handles variable spacing around "candidate - "
+    match = _SUBJECT_RE.match(subject)
     
-    if match:
-        return match.group(1).strip()
+    if not match:
+        return None, None
     
-    return None
+    name = match.group("name")
+    return match.group("title").strip(), name.strip() if name else None
 
 
-def get_email_body(gmail, msg_id) -> str:
+def get_email_body(msg) -> str:
     """Extract the plain text body from an email."""
-    msg = gmail.users().messages().get(userId="me", id=msg_id, format="full").execute()
-    
     payload = msg.get("payload", {})
     
     # Check for plain text body directly
@@ -126,19 +162,8 @@ def parse_candidate_email_from_body(body: str) -> str | None:
     if not body:
         return None
     
-    # Common patterns in Betterteam emails:
-    # "Email: candidate@example.com"
-    # "email: candidate@example.com"
-    # "E-mail: candidate@example.com"
-    patterns = [
-        r"[Ee]-?mail:\s*([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})",
-        r"Email Address:\s*([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})",
-        # Generic email pattern - find any email that's not betterteam/noreply
-        r"([a-zA-Z0-9._%+-]+@(?!betterteam|noreply)[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})",
-    ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, body)
+    for pattern in _BODY_EMAIL_RES:
+        match = pattern.search(body)
         if match:
             email = match.group(1).strip()
             # Skip common system emails
@@ -148,9 +173,8 @@ def parse_candidate_email_from_body(body: str) -> str | None:
     return None
 
 
-def download_resume(gmail, msg_id, filename_prefix):
+def download_resume(gmail, msg, filename_prefix):
     """Download resume attachment (PDF, DOCX, DOC)."""
-    msg = gmail.users().messages().get(userId="me", id=msg_id, format="full").execute()
     parts = msg.get("payload", {}).get("parts", [])
     
     # Supported resume formats
@@ -161,19 +185,26 @@ def download_resume(gmail, msg_id, filename_prefix):
         if not filename.lower().endswith(valid_extensions):
             continue
 
-        att_id = part.get("body", {}).get("attachmentId")
-        if not att_id:
-            continue
+        body = part.get("body", {})
+        data = body.get("data")
+        if not data:
+            # Larger attachments are not inlined in format=full, fetch them separately
+            att_id = body.get("attachmentId")
+            if not att_id:
+                continue
 
-        attachment = gmail.users().messages().attachments().get(
-            userId="me", messageId=msg_id, id=att_id
-        ).execute()
+            data = gmail.users().messages().attachments().get(
+                userId="me", messageId=msg["id"], id=att_id
+            ).execute()["data"]
 
         # Keep original extension
         ext = Path(filename).suffix.lower()
-        safe_name = re.sub(r"[^\w\-_.]", "_", filename_prefix)
-        filepath = DOWNLOADS_DIR / f"{safe_name}_resume{ext}"
-        filepath.write_bytes(base64.urlsafe_b64decode(attachment["data"]))
+        safe_name = _SAFE_NAME_RE.sub("_", filename_prefix)
+        # Message id keeps same-named applicants processed in parallel apart
+        filepath = DOWNLOADS_DIR / f"{safe_name}_{msg['id']}_resume{ext}"
+        # Decode straight from ASCII bytes into the file, no intermediate copies kept around
+        with filepath.open("wb") as f:
+            f.write(base64.urlsafe_b64decode(data.encode("ascii")))
         return filepath
 
     return None
@@ -185,6 +216,13 @@ def mark_as_read(gmail, msg_id):
     ).execute()
 
 
+def mark_all_as_read(gmail, msg_ids):
+    """Remove the UNREAD label from many emails in a single call."""
+    gmail.users().messages().batchModify(
+        userId="me", body={"ids": msg_ids, "removeLabelIds": ["UNREAD"]}
+    ).execute()
+
+
 # --- Resume Parsing with Gemini ---
 def extract_text_from_docx(filepath):
     """Extract text from a DOCX file using python-docx."""
@@ -197,6 +235,57 @@ def extract_text_from_docx(filepath):
 
 
 def parse_resume(filepath):
+    """Return the resume text, reusing the cached result for identical files."""
+    digest = hashlib.sha256(Path(filepath).read_bytes()).hexdigest()
+    
+    with _resume_cache_lock:
+        cached = _resume_cache.get(digest)
+    if cached is not None:
+        log("INFO", f"Resume already parsed, using cached text: {filepath}")
+        return cached
+    
+    resume_text = extract_resume_text(filepath)
+    
+    with _resume_cache_lock:
+        if len(_resume_cache) >= RESUME_CACHE_SIZE:
+            # Evict the oldest entry (dicts keep insertion order)
+            _resume_cache.pop(next(iter(_resume_cache)))
+        _resume_cache[digest] = resume_text
+    return resume_text
+
+
+def resume_text_from_response(response) -> str:
+    """
+    Pull the text field out of a structured resume extraction response.
+    
+    If the output was cut off by max_output_tokens, the partial text value is
+    recovered and un-escaped. Anything else raises ValueError so the email is
+    left unread and retried.
+    """
+    raw = response.text or ""
+    try:
+        return json.loads(raw)["text"]
+    except json.JSONDecodeError:
+        pass
+    except (KeyError, TypeError):
+        raise ValueError("Resume extraction response has no text field")
+    
+    match = _PARTIAL_TEXT_RE.match(raw)
+    if match:
+        fragment = match.group(1)
+        # Drop a dangling partial escape at the cut-off point (e.g. "\\" or "\\u00")
+        for cut in range(6):
+            try:
+                text = json.loads(f'"{fragment[:len(fragment) - cut]}"')
+            except json.JSONDecodeError:
+                continue
+            log("WARN", f"Resume extraction was truncated, keeping {len(text)} chars")
+            return text
+    
+    raise ValueError("Resume extraction returned malformed JSON")
+
+
+def extract_resume_text(filepath):
     log("INFO", f"Parsing resume with Gemini: {filepath}")
     
     gemini_client = get_gemini()
@@ -211,52 +300,79 @@ def parse_resume(filepath):
             # Use Gemini to clean up and structure the text
             response = gemini_client.models.generate_content(
                 model="gemini-2.0-flash",
-                contents=f"Clean up and format this resume text. Return it in a readable format:\n\n{raw_text}"
+                contents=f"Clean up and format this resume text. Return it in a readable format:\n\n{raw_text}",
+                config=RESUME_EXTRACTION_CONFIG,
             )
-            return response.text
+            return resume_text_from_response(response)
         except Exception as e:
             log("ERROR", f"Failed to extract text from {ext}: {e}")
             raise
     
-    # Handle PDF files - upload to Gemini
+    # Handle PDF files - send inline in a single request when small enough
     elif ext == ".pdf":
+        pdf_bytes = Path(filepath).read_bytes()
+        if len(pdf_bytes) <= INLINE_PDF_MAX_BYTES:
+            response = gemini_client.models.generate_content(
+                model="gemini-2.0-flash",
+                contents=[
+                    types.Part.from_bytes(data=pdf_bytes, mime_type="application/pdf"),
+                    RESUME_PDF_PROMPT,
+                ],
+                config=RESUME_EXTRACTION_CONFIG,
+            )
+            return resume_text_from_response(response)
+        
+        # Large PDFs go through the files API
         uploaded_file = gemini_client.files.upload(file=filepath, config={"mime_type": "application/pdf"})
         
         response = gemini_client.models.generate_content(
             model="gemini-2.0-flash",
-            contents=[
-                uploaded_file,
-                "Extract all text content from this resume PDF. Return the full text in a clean, readable format."
-            ]
+            contents=[uploaded_file, RESUME_PDF_PROMPT],
+            config=RESUME_EXTRACTION_CONFIG,
         )
         
         # Clean up uploaded file
         gemini_client.files.delete(name=uploaded_file.name)
-        return response.text
+        return resume_text_from_response(response)
     
     else:
         raise ValueError(f"Unsupported file type: {ext}")
 
 
 # --- Supabase ---
-def candidate_exists(supabase, email):
-    result = supabase.table("candidates").select("id").eq("email", email).execute()
-    return len(result.data) > 0
+def fetch_existing_emails(supabase, emails) -> set[str]:
+    """Return the subset of emails that already have a candidate row."""
+    emails = list(set(emails))
+    existing = set()
+    for start in range(0, len(emails), SUPABASE_CHUNK_SIZE):
+        result = (
+            get_candidates_table(supabase)
+            .select("email")
+            .in_("email", emails[start:start + SUPABASE_CHUNK_SIZE])
+            .execute()
+        )
+        existing.update(row["email"] for row in result.data)
+    return existing
 
 
 def lookup_job(supabase, job_title: str) -> dict | None:
     """Query jobs table and match title with whitespace/case normalization."""
-    # Normalize the extracted title
-    normalized_email_title = job_title.strip().lower()
-    
     log("DEBUG", f"Looking up job: '{job_title}'")
-    
-    # Fetch all jobs and match in Python (handles newlines, whitespace, case)
-    result = supabase.table("jobs").select("id, description, title").execute()
-    
-    if not result.data:
-        log("DEBUG", "No jobs found in database")
-        return None
+    return _lookup_job_normalized(supabase, job_title.strip().lower())
+
+
+@lru_cache(maxsize=128)
+def _lookup_job_normalized(supabase, normalized_email_title: str) -> dict | None:
+    """Cached per title so repeated applications for the same job skip the DB."""
+    # Let Postgres narrow the candidates with a case-insensitive substring match,
+    # then confirm in Python (DB titles may carry stray newlines/whitespace)
+    escaped = _LIKE_SPECIAL_RE.sub(r"\\\1", normalized_email_title)
+    result = (
+        supabase.table("jobs")
+        .select("id, description, title")
+        .ilike("title", f"%{escaped}%")
+        .execute()
+    )
     
     for job in result.data:
         db_title = job.get("title", "")
@@ -266,12 +382,12 @@ def lookup_job(supabase, job_title: str) -> dict | None:
             log("DEBUG", f"Matched: '{db_title.strip()}'")
             return job
     
-    log("DEBUG", f"Extracted: '{job_title}' | No matching job in DB")
+    log("DEBUG", f"Extracted: '{normalized_email_title}' | No matching job in DB")
     return None
 
 
-def save_candidate(supabase, email, name, resume_text, gmail_msg_id, job_id, job_description):
-    supabase.table("candidates").insert({
+def build_candidate_row(email, name, resume_text, gmail_msg_id, job_id, job_description) -> dict:
+    return {
         "email": email,
         "full_name": name,
         "resume_text": resume_text,
@@ -279,69 +395,100 @@ def save_candidate(supabase, email, name, resume_text, gmail_msg_id, job_id, job
         "job_id": job_id,
         "job_description": job_description,
         "metadata": {"gmail_message_id": gmail_msg_id},
-    }).execute()
+    }
+
+
+def save_candidates(gmail, supabase, rows) -> int:
+    """
+    Insert queued candidates in bulk, then mark the saved ones' emails as read.
+    Returns the number of rows that could not be saved.
+    """
+    saved = []
+    for start in range(0, len(rows), SUPABASE_CHUNK_SIZE):
+        chunk = rows[start:start + SUPABASE_CHUNK_SIZE]
+        try:
+            get_candidates_table(supabase).insert(chunk).execute()
+            saved.extend(chunk)
+        except Exception as e:
+            # One bad row fails the whole insert - retry individually so it only fails itself
+            log("WARN", f"Bulk insert of {len(chunk)} candidate(s) failed, retrying one by one: {e}")
+            for row in chunk:
+                try:
+                    get_candidates_table(supabase).insert(row).execute()
+                    saved.append(row)
+                except Exception as e:
+                    log("ERROR", f"Failed to save {row['email']}: {e}")
+
+    if saved:
+        mark_all_as_read(gmail, [row["metadata"]["gmail_message_id"] for row in saved])
+        log("INFO", f"Saved {len(saved)} candidate(s)")
+    return len(rows) - len(saved)
 
 
 # --- Main Processing ---
-def process_email(gmail, supabase, msg_id):
-    sender_email, sender_name = get_sender(gmail, msg_id)
+def get_candidate_email(msg) -> str:
+    """Extract the REAL candidate email from the body, falling back to the sender."""
+    # Betterteam emails come from noreply@betterteam.com, but contain the actual email in body
+    sender_email, _ = get_sender(extract_headers(msg))
+    candidate_email = parse_candidate_email_from_body(get_email_body(msg))
+    
+    if candidate_email:
+        log("INFO", f"Found candidate email in body: {candidate_email}")
+        return candidate_email
+    
+    # Fallback to sender if we can't find email in body
+    log("WARN", f"Could not find candidate email in body, using sender: {sender_email}")
+    return sender_email
+
+
+def process_email(gmail, supabase, msg, email, existing_emails) -> dict | None:
+    """
+    Route one application email to its job and parse the resume.
+    Returns the candidate row to insert, or None if the email was skipped.
+    """
+    msg_id = msg["id"]
+    headers = extract_headers(msg)
+    sender_email, sender_name = get_sender(headers)
     log("INFO", f"Processing email from {sender_email}...")
 
     # --- Job Router Logic ---
-    subject = get_email_subject(gmail, msg_id)
-    job_title = parse_job_title_from_subject(subject)
+    subject = get_email_subject(headers)
+    job_title, name = parse_subject(subject)
     
     if not job_title:
         log("ERROR", f"Could not parse job title from subject: '{subject}'")
-        return
+        return None
     
-    # Parse candidate name from subject
-    name = parse_name_from_subject(subject)
     if not name:
         log("WARN", f"Could not parse name from subject, using sender name: {sender_name}")
         name = sender_name
     
-    # --- Extract REAL candidate email from body ---
-    # Betterteam emails come from noreply@betterteam.com, but contain the actual email in body
-    email_body = get_email_body(gmail, msg_id)
-    candidate_email = parse_candidate_email_from_body(email_body)
-    
-    if candidate_email:
-        log("INFO", f"Found candidate email in body: {candidate_email}")
-        email = candidate_email
-    else:
-        # Fallback to sender if we can't find email in body
-        log("WARN", f"Could not find candidate email in body, using sender: {sender_email}")
-        email = sender_email
-    # --- End email extraction ---
-    
     job = lookup_job(supabase, job_title)
     
     if not job:
         log("ERROR", f"CRITICAL: Job '{job_title}' not found in DB. Skipping candidate.")
-        return
+        return None
     
     log("INFO", f"Matched job: {job_title} (ID: {job['id']}) | Candidate: {name} <{email}>")
     # --- End Job Router ---
 
-    if candidate_exists(supabase, email):
+    if email in existing_emails:
         log("INFO", f"{email} already exists, skipping")
         mark_as_read(gmail, msg_id)
-        return
+        return None
 
-    filepath = download_resume(gmail, msg_id, name or email)
+    filepath = download_resume(gmail, msg, name or email)
     if not filepath:
         log("WARN", f"No resume attachment (PDF/DOCX/DOC) for {email}, skipping")
-        return
+        return None
 
     resume_text = parse_resume(filepath)
-    save_candidate(supabase, email, name, resume_text, msg_id, job["id"], job["description"])
-    mark_as_read(gmail, msg_id)
     
     # Cleanup downloaded file
     filepath.unlink(missing_ok=True)
     
-    log("INFO", f"Saved {name} <{email}> for job: {job_title}")
+    log("INFO", f"Parsed {name} <{email}> for job: {job_title}")
+    return build_candidate_row(email, name, resume_text, msg_id, job["id"], job["description"])
 
 
 def run_ingest() -> int:
@@ -354,6 +501,8 @@ def run_ingest() -> int:
     gmail = get_gmail_service()
     supabase = get_supabase_client()
     DOWNLOADS_DIR.mkdir(exist_ok=True)
+    # Jobs may have been added since the last cycle
+    _lookup_job_normalized.cache_clear()
 
     messages = fetch_unread_emails(gmail)
     log("INFO", f"Found {len(messages)} unread application(s)")
@@ -361,15 +510,85 @@ def run_ingest() -> int:
     if not messages:
         return 0
 
+    # One batched fetch gives headers, body and attachment ids for every email
+    full_messages = fetch_messages_full(gmail, [msg["id"] for msg in messages])
+
     success, failed = 0, 0
+    candidate_emails = {}
     for msg in messages:
         try:
-            process_email(gmail, supabase, msg["id"])
-            success += 1
+            # Fall back to a direct fetch if the message failed in the batch
+            if msg["id"] not in full_messages:
+                full_messages[msg["id"]] = fetch_message_full(gmail, msg["id"])
+            candidate_emails[msg["id"]] = get_candidate_email(full_messages[msg["id"]])
         except Exception as e:
-            log("ERROR", f"Failed to process {msg['id']}: {e}")
+            log("ERROR", f"Failed to fetch {msg['id']}: {e}")
             failed += 1
 
+    # Check every candidate against the DB in one query instead of one per email
+    existing_emails = fetch_existing_emails(supabase, candidate_emails.values())
+
+    pending = []
+
+    def flush():
+        nonlocal success, failed
+        try:
+            unsaved = save_candidates(gmail, supabase, pending)
+            success -= unsaved
+            failed += unsaved
+        except Exception as e:
+            # Rows are saved; their emails are skipped as existing next cycle
+            log("ERROR", f"Failed to mark saved candidates' emails as read: {e}")
+        pending.clear()
+
+    def process_candidate_emails(email, msg_ids):
+        """
+        Process one candidate's emails in order on a single worker, so the
+        existing-email check stays race-free. Stops at the first email that
+        yields a row; later ones stay unread and are skipped as existing next
+        cycle. Returns (row or None, succeeded, failed).
+        """
+        gmail = get_gmail_service()
+        succeeded, failed_here = 0, 0
+        for msg_id in msg_ids:
+            try:
+                row = process_email(gmail, supabase, full_messages[msg_id], email, existing_emails)
+                succeeded += 1
+            except Exception as e:
+                log("ERROR", f"Failed to process {msg_id}: {e}")
+                failed_here += 1
+                continue
+            if row:
+                return row, succeeded, failed_here
+        return None, succeeded, failed_here
+
+    msg_ids_by_email = {}
+    for msg_id, email in candidate_emails.items():
+        msg_ids_by_email.setdefault(email, []).append(msg_id)
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        futures = {
+            executor.submit(process_candidate_emails, email, msg_ids): email
+            for email, msg_ids in msg_ids_by_email.items()
+        }
+        for future in as_completed(futures):
+            try:
+                row, succeeded, failed_here = future.result()
+            except Exception as e:
+                log("ERROR", f"Failed to process emails from {futures[future]}: {e}")
+                failed += len(msg_ids_by_email[futures[future]])
+                continue
+            success += succeeded
+            failed += failed_here
+
+            if row:
+                pending.append(row)
+                if len(pending) >= INSERT_FLUSH_SIZE:
+                    flush()
+
+    if pending:
+        flush()
+
     log("INFO", f"Ingestion complete: {success} succeeded, {failed} failed")
     return success
 
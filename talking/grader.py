@@ -2,7 +2,7 @@
 """The Brain: Scores candidates against the job description using Gemini."""
 
 import json
-from utils import get_supabase_client, get_gemini_client, log
+from utils import get_supabase_client, get_candidates_table, get_gemini_client, log
 
 # --- Configuration ---
 # Note: JOB_DESCRIPTION is now fetched from the candidates table (job_description column)
@@ -26,7 +26,7 @@ Return ONLY a valid JSON object in this exact format, nothing else:
 def fetch_ungraded_candidates(supabase):
     """Fetch candidates with status NEW_APPLICATION."""
     result = (
-        supabase.table("candidates")
+        get_candidates_table(supabase)
         .select("id, email, full_name, resume_text, job_description, metadata")
         .eq("status", "NEW_APPLICATION")
         .execute()
@@ -78,7 +78,7 @@ def update_candidate_grade(supabase, candidate_id: int, score: int, reasoning: s
     # Set status based on score (70+ passes to mailer, below = rejected)
     status = "GRADED" if score >= 70 else "CV_REJECTED"
     
-    supabase.table("candidates").update({
+    get_candidates_table(supabase).update({
         "jd_match_score": score,
         "status": status,
         "metadata": updated_metadata
@@ -16,13 +16,19 @@ import sys
 import time
 import json
 import base64
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from email.mime.text import MIMEText
+from email.utils import parseaddr
 
 # Add read/ directory to path for importing ingest
 sys.path.insert(0, str(Path(__file__).parent.parent / "read"))
 
-from utils import get_supabase_client, get_gmail_service, get_gemini_client, log
+from utils import (
+    get_supabase_client, get_candidates_table, get_gmail_service, get_gemini_client,
+    fetch_messages_metadata, extract_headers, log,
+)
 
 # Import the other modules' run functions
 from grader import run_grader
@@ -41,6 +47,8 @@ except ImportError:
 COMPANY_NAME = "Printerpix"
 INTERVIEW_BASE_URL = "https://intervieww-fw4n.vercel.app/interview"
 LOOP_INTERVAL_SECONDS = 60  # How often to run the pipeline
+MAX_WORKERS = 8  # Concurrent replies in flight, well under Gmail's per-user quota
+REPLY_QUERY_CHUNK_SIZE = 20  # Senders per Gmail search, keeps the query under length limits
 
 VISA_CHECK_PROMPT = """The candidate was asked about their visa/work authorization status.
 
@@ -63,6 +71,22 @@ INVALID (return false):
 
 Return ONLY a valid JSON object: {{"has_valid_visa": true}} or {{"has_valid_visa": false}}"""
 
+# Lexicon fast path: only clear "needs sponsorship / employer visa" replies are
+# rejected locally. Approvals and anything ambiguous always go to Gemini.
+SPONSORSHIP_RE = re.compile(
+    r"\b(employer visa|employment visa|sponsorship|need sponsor|needs sponsor|labou?r transfer)\b",
+    re.IGNORECASE,
+)
+# Any mention of a valid-looking status makes the reply ambiguous
+VALID_VISA_HINT_RE = re.compile(
+    r"\b(personal|golden|gold|freelance|investor|family) visa\b|green card|permanent resident|"
+    r"residency|citizen|national|work permit|pr holder",
+    re.IGNORECASE,
+)
+# "don't need sponsorship", "haven't", "don’t" (curly apostrophe)... flip the meaning
+NEGATION_RE = re.compile(r"\b(not|no|without|never)\b|n['’]t\b", re.IGNORECASE)
+MARKDOWN_FENCE_RE = re.compile(r"^```(?:json)?\s*|\s*```$")
+
 APPROVAL_EMAIL = """Hi {full_name},
 
 Thanks for confirming! You are invited to an AI Interview.
@@ -89,7 +113,7 @@ Best of luck in your job search!
 def fetch_questionnaire_candidates(supabase):
     """Fetch candidates who were sent the questionnaire."""
     result = (
-        supabase.table("candidates")
+        get_candidates_table(supabase)
         .select("id, email, full_name, interview_token")
         .eq("status", "QUESTIONNAIRE_SENT")
         .execute()
@@ -97,23 +121,28 @@ def fetch_questionnaire_candidates(supabase):
     return result.data
 
 
-def search_unread_from(gmail_service, email: str):
-    """Search for unread emails from a specific sender."""
-    query = f"from:{email} is:unread"
-    result = gmail_service.users().messages().list(userId="me", q=query).execute()
-    return result.get("messages", [])
+def search_unread_from_any(gmail_service, emails: list[str]) -> list[dict]:
+    """Search for unread emails from any of the given senders (one query per chunk)."""
+    messages = []
+    for start in range(0, len(emails), REPLY_QUERY_CHUNK_SIZE):
+        senders = " OR ".join(f"from:{email}" for email in emails[start:start + REPLY_QUERY_CHUNK_SIZE])
+        request = gmail_service.users().messages().list(userId="me", q=f"is:unread ({senders})")
+        while request is not None:
+            result = request.execute()
+            messages.extend(result.get("messages", []))
+            request = gmail_service.users().messages().list_next(request, result)
+    return messages
 
 
-def get_email_body(gmail_service, msg_id: str) -> str:
-    """Extract the body/snippet from an email message."""
-    msg = gmail_service.users().messages().get(userId="me", id=msg_id, format="full").execute()
-    
+def get_email_body(gmail_service, msg: dict) -> str:
+    """Extract the body/snippet from an email message fetched as metadata."""
     # Try to get the snippet (short preview) first - it's usually enough
     snippet = msg.get("snippet", "")
     if snippet:
         return snippet
     
-    # If no snippet, try to extract from payload
+    # If no snippet, fetch the full message and extract from payload
+    msg = gmail_service.users().messages().get(userId="me", id=msg["id"], format="full").execute()
     payload = msg.get("payload", {})
     
     # Check for plain text body
@@ -133,8 +162,19 @@ def get_email_body(gmail_service, msg_id: str) -> str:
     return ""
 
 
+def needs_sponsorship(reply_text: str) -> bool:
+    """True only for unambiguous sponsorship/employer-visa replies; everything else needs Gemini."""
+    if NEGATION_RE.search(reply_text) or VALID_VISA_HINT_RE.search(reply_text):
+        return False
+    return bool(SPONSORSHIP_RE.search(reply_text))
+
+
 def analyze_visa_status(gemini_client, reply_text: str) -> bool:
     """Use Gemini to analyze if candidate has valid visa."""
+    if needs_sponsorship(reply_text):
+        log("INFO", "Visa status decided by keywords: needs sponsorship")
+        return False
+    
     prompt = VISA_CHECK_PROMPT.format(reply_text=reply_text)
     
     # Use JSON mode for guaranteed valid JSON output
@@ -146,7 +186,7 @@ def analyze_visa_status(gemini_client, reply_text: str) -> bool:
         }
     )
     
-    response_text = response.text.strip()
+    response_text = MARKDOWN_FENCE_RE.sub("", response.text.strip())
     
     try:
         result = json.loads(response_text)
@@ -217,18 +257,52 @@ def send_rejection_email(gmail_service, email: str, full_name: str):
     gmail_service.users().messages().send(userId="me", body=message).execute()
 
 
-def mark_as_read(gmail_service, msg_id: str):
-    """Remove the UNREAD label from an email."""
-    gmail_service.users().messages().modify(
-        userId="me", id=msg_id, body={"removeLabelIds": ["UNREAD"]}
+def mark_all_as_read(gmail_service, msg_ids: list[str]):
+    """Remove the UNREAD label from many emails in a single call."""
+    gmail_service.users().messages().batchModify(
+        userId="me", body={"ids": msg_ids, "removeLabelIds": ["UNREAD"]}
     ).execute()
 
 
-def update_candidate_status(supabase, candidate_id: int, status: str):
-    """Update the candidate's status in Supabase."""
-    supabase.table("candidates").update({
+def update_candidates_status(supabase, candidate_ids: list[int], status: str):
+    """Set the same status on many candidates in one Supabase call."""
+    get_candidates_table(supabase).update({
         "status": status
-    }).eq("id", candidate_id).execute()
+    }).in_("id", candidate_ids).execute()
+
+
+def process_reply(gemini_client, candidate: dict, msg: dict) -> str | None:
+    """
+    Run the visa check on one candidate's reply and send the outcome email.
+    Runs in a worker thread. Returns the candidate's new status, or None if skipped.
+    The reply is left unread; the caller marks it read once the status is saved.
+    """
+    gmail_service = get_gmail_service()
+    email = candidate["email"]
+    full_name = candidate.get("full_name", "Candidate")
+    interview_token = candidate["interview_token"]
+    
+    reply_text = get_email_body(gmail_service, msg)
+    
+    if not reply_text:
+        log("WARN", f"Empty reply from {email}, skipping")
+        return None
+    
+    log("INFO", f"Processing reply from {email}...")
+    
+    # Analyze visa status with Gemini
+    has_valid_visa = analyze_visa_status(gemini_client, reply_text)
+    
+    if has_valid_visa:
+        send_approval_email(gmail_service, email, full_name, interview_token)
+        status = "INVITE_SENT"
+        log("INFO", f"Processed {email}: Visa Valid? True - Invite sent")
+    else:
+        send_rejection_email(gmail_service, email, full_name)
+        status = "REJECTED_VISA"
+        log("INFO", f"Processed {email}: Visa Valid? False - Rejected")
+    
+    return status
 
 
 def run_listener() -> int:
@@ -248,54 +322,69 @@ def run_listener() -> int:
     if not candidates:
         return 0
     
+    # Only candidates with an interview link can be processed
+    candidates_by_email = {}
+    for candidate in candidates:
+        if not candidate.get("interview_token"):
+            log("WARN", f"No interview_token for {candidate.get('email', 'unknown')}, skipping")
+            continue
+        candidates_by_email[candidate["email"].lower()] = candidate
+    
+    # Search all candidates' unread replies at once, then fetch them in one batch.
+    # Metadata is enough for the sender and snippet; full bodies are only fetched if needed
+    messages = search_unread_from_any(gmail_service, list(candidates_by_email))
+    reply_messages = fetch_messages_metadata(gmail_service, [msg["id"] for msg in messages], ["From"])
+    
+    # Bucket replies by sender, keeping the first (newest) unread message per candidate
+    replies = {}
+    for msg in messages:
+        full_msg = reply_messages.get(msg["id"])
+        if full_msg is None:
+            continue
+        _, sender = parseaddr(extract_headers(full_msg).get("from", ""))
+        sender = sender.lower()
+        if sender in candidates_by_email and sender not in replies:
+            replies[sender] = (candidates_by_email[sender], full_msg)
+    
+    if not replies:
+        # No replies yet - nothing to do
+        log("INFO", "Reply check complete: 0 processed")
+        return 0
+    
     processed = 0
+    # status -> [(candidate_id, reply msg_id), ...]
+    replies_by_status = {}
     
-    for candidate in candidates:
-        try:
-            email = candidate["email"]
-            full_name = candidate.get("full_name", "Candidate")
-            candidate_id = candidate["id"]
-            interview_token = candidate.get("interview_token")
-            
-            if not interview_token:
-                log("WARN", f"No interview_token for {email}, skipping")
-                continue
-            
-            # Search for unread replies from this candidate
-            messages = search_unread_from(gmail_service, email)
-            
-            if not messages:
-                # No reply yet - skip silently
-                continue
-            
-            # Process the first unread message
-            msg_id = messages[0]["id"]
-            reply_text = get_email_body(gmail_service, msg_id)
-            
-            if not reply_text:
-                log("WARN", f"Empty reply from {email}, skipping")
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        futures = {
+            executor.submit(process_reply, gemini_client, candidate, msg): (candidate, msg)
+            for candidate, msg in replies.values()
+        }
+        for future in as_completed(futures):
+            candidate, msg = futures[future]
+            try:
+                status = future.result()
+            except Exception as e:
+                log("ERROR", f"Failed to process {candidate.get('email', 'unknown')}: {e}")
                 continue
-            
-            log("INFO", f"Processing reply from {email}...")
-            
-            # Analyze visa status with Gemini
-            has_valid_visa = analyze_visa_status(gemini_client, reply_text)
-            
-            if has_valid_visa:
-                send_approval_email(gmail_service, email, full_name, interview_token)
-                update_candidate_status(supabase, candidate_id, "INVITE_SENT")
-                log("INFO", f"Processed {email}: Visa Valid? True - Invite sent")
-            else:
-                send_rejection_email(gmail_service, email, full_name)
-                update_candidate_status(supabase, candidate_id, "REJECTED_VISA")
-                log("INFO", f"Processed {email}: Visa Valid? False - Rejected")
-            
-            # Mark the email as read so we don't process it again
-            mark_as_read(gmail_service, msg_id)
-            processed += 1
-            
+            if status:
+                replies_by_status.setdefault(status, []).append((candidate["id"], msg["id"]))
+    
+    # One update per status bucket instead of one per candidate. Replies are only
+    # marked read after their status is saved, so a failed update is retried next cycle
+    for status, bucket in replies_by_status.items():
+        try:
+            update_candidates_status(supabase, [candidate_id for candidate_id, _ in bucket], status)
+        except Exception as e:
+            log("ERROR", f"Failed to set {status} on {len(bucket)} candidate(s): {e}")
+            continue
+        processed += len(bucket)
+        
+        try:
+            mark_all_as_read(gmail_service, [msg_id for _, msg_id in bucket])
         except Exception as e:
-            log("ERROR", f"Failed to process {candidate.get('email', 'unknown')}: {e}")
+            # Status is saved, so these candidates won't be picked up again
+            log("ERROR", f"Failed to mark {len(bucket)} {status} reply(ies) as read: {e}")
     
     log("INFO", f"Reply check complete: {processed} processed")
     return processed
@@ -4,7 +4,7 @@
 import base64
 from email.mime.text import MIMEText
 
-from utils import get_supabase_client, get_gmail_service, log
+from utils import get_supabase_client, get_candidates_table, get_gmail_service, log
 
 # --- Configuration ---
 COMPANY_NAME = "Printerpix"
@@ -62,7 +62,7 @@ Best of luck!
 def fetch_top_candidates(supabase):
     """Fetch graded candidates with score >= MIN_SCORE including job_description and interview_token."""
     result = (
-        supabase.table("candidates")
+        get_candidates_table(supabase)
         .select("id, email, full_name, jd_match_score, job_description, interview_token")
         .eq("status", "GRADED")
         .gte("jd_match_score", MIN_SCORE)
@@ -112,7 +112,7 @@ def send_interview_invite(gmail_service, email: str, full_name: str, interview_t
 
 def update_candidate_status(supabase, candidate_id: int, status: str):
     """Update candidate status."""
-    supabase.table("candidates").update({
+    get_candidates_table(supabase).update({
         "status": status
     }).eq("id", candidate_id).execute()
 
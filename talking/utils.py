@@ -3,6 +3,8 @@
 
 import os
 import json
+import threading
+from functools import lru_cache
 from pathlib import Path
 
 # dotenv is optional - Railway provides env vars directly
@@ -11,11 +13,15 @@ try:
 except ImportError:
     def load_dotenv():
         pass  # No-op in production
+import httplib2
+import httpx
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
+from google_auth_httplib2 import AuthorizedHttp
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
 from supabase import create_client
+from supabase.lib.client_options import SyncClientOptions
 from google import genai
 
 # Load environment variables (for local dev)
@@ -37,10 +43,29 @@ SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
+# Gmail advises at most 50 calls per batch; larger batches get rate limited (429)
+GMAIL_BATCH_SIZE = 50
+GMAIL_HTTP_TIMEOUT = 30  # Seconds
+
+# Connection pool for Supabase REST calls (shared by worker threads). httpx's
+# default pool sizes, with idle connections kept long enough to span pipeline steps
+SUPABASE_HTTP_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=60)
+
 # Production env vars for headless auth
 GOOGLE_TOKEN_JSON = os.getenv("GOOGLE_TOKEN_JSON")
 GOOGLE_CREDENTIALS_JSON = os.getenv("GOOGLE_CREDENTIALS_JSON")
 
+# One Supabase client per process so every table call shares warm connections
+_supabase_client = None
+_supabase_client_lock = threading.Lock()
+
+# Gmail credentials are loaded once and shared; AuthorizedHttp refreshes them as needed
+_gmail_creds = None
+_gmail_creds_lock = threading.Lock()
+
+# Per-thread state for worker pools (the Gmail client's http is not thread-safe)
+_thread_local = threading.local()
+
 
 def log(level: str, msg: str):
     """Print a formatted log message."""
@@ -48,15 +73,37 @@ def log(level: str, msg: str):
 
 
 def get_supabase_client():
-    """Initialize and return the Supabase client."""
-    if not SUPABASE_URL or not SUPABASE_KEY:
-        raise ValueError("Missing SUPABASE_URL or SUPABASE_KEY environment variables")
-    return create_client(SUPABASE_URL, SUPABASE_KEY)
+    """Return the shared Supabase client, initializing it on first use."""
+    global _supabase_client
+    with _supabase_client_lock:
+        if _supabase_client is None:
+            if not SUPABASE_URL or not SUPABASE_KEY:
+                raise ValueError("Missing SUPABASE_URL or SUPABASE_KEY environment variables")
+            http_client = httpx.Client(http2=True, follow_redirects=True, limits=SUPABASE_HTTP_LIMITS)
+            _supabase_client = create_client(
+                SUPABASE_URL, SUPABASE_KEY, options=SyncClientOptions(httpx_client=http_client)
+            )
+        return _supabase_client
 
 
-def get_gmail_service():
+@lru_cache(maxsize=None)
+def get_candidates_table(supabase):
+    """Return the `candidates` query builder, built once per (shared) client."""
+    return supabase.table("candidates")
+
+
+def get_gmail_credentials():
+    """Return the shared Gmail credentials, authenticating on first use."""
+    global _gmail_creds
+    with _gmail_creds_lock:
+        if _gmail_creds is None:
+            _gmail_creds = _load_gmail_credentials()
+        return _gmail_creds
+
+
+def _load_gmail_credentials():
     """
-    Authenticate with Gmail and return the service resource.
+    Authenticate with Gmail and return the OAuth credentials.
     
     Production Mode (Railway):
         - Reads GOOGLE_TOKEN_JSON env var for access/refresh tokens
@@ -134,7 +181,27 @@ def get_gmail_service():
         elif not creds and is_production:
             raise RuntimeError("No valid credentials in production. Check GOOGLE_TOKEN_JSON and GOOGLE_CREDENTIALS_JSON env vars.")
     
-    return build("gmail", "v1", credentials=creds)
+    return creds
+
+
+def build_gmail_service(creds):
+    """Build a Gmail service resource on a persistent keep-alive connection."""
+    authed_http = AuthorizedHttp(creds, http=httplib2.Http(timeout=GMAIL_HTTP_TIMEOUT))
+    return build("gmail", "v1", http=authed_http, cache_discovery=False)
+
+
+def get_gmail_service():
+    """
+    Return the Gmail service resource for the current thread.
+    
+    The service (and its open TLS connection) is built once per thread and
+    reused across calls, since httplib2 connections are not thread-safe.
+    """
+    service = getattr(_thread_local, "gmail_service", None)
+    if service is None:
+        service = build_gmail_service(get_gmail_credentials())
+        _thread_local.gmail_service = service
+    return service
 
 
 def get_gemini_client():
@@ -142,3 +209,46 @@ def get_gemini_client():
     if not GEMINI_API_KEY:
         raise ValueError("Missing GEMINI_API_KEY environment variable")
     return genai.Client(api_key=GEMINI_API_KEY)
+
+
+def fetch_messages_full(gmail_service, msg_ids: list[str]) -> dict[str, dict]:
+    """Fetch full Gmail messages (headers, body, attachment ids) in batches."""
+    return _batch_get_messages(gmail_service, msg_ids, format="full")
+
+
+def fetch_messages_metadata(gmail_service, msg_ids: list[str], headers: list[str]) -> dict[str, dict]:
+    """Fetch only the snippet and the given headers of Gmail messages, in batches."""
+    return _batch_get_messages(gmail_service, msg_ids, format="metadata", metadataHeaders=headers)
+
+
+def _batch_get_messages(gmail_service, msg_ids: list[str], **params) -> dict[str, dict]:
+    """
+    Fetch Gmail messages in batches instead of one request per message.
+    
+    Returns a dict of message id -> message. Messages that fail to fetch are
+    logged and left out of the result.
+    """
+    messages = {}
+    unique_ids = list(dict.fromkeys(msg_ids))  # Batch request ids must be unique
+    
+    def on_response(request_id, response, exception):
+        if exception is not None:
+            log("ERROR", f"Failed to fetch message {request_id}: {exception}")
+            return
+        messages[request_id] = response
+    
+    for start in range(0, len(unique_ids), GMAIL_BATCH_SIZE):
+        batch = gmail_service.new_batch_http_request(callback=on_response)
+        for msg_id in unique_ids[start:start + GMAIL_BATCH_SIZE]:
+            batch.add(
+                gmail_service.users().messages().get(userId="me", id=msg_id, **params),
+                request_id=msg_id,
+            )
+        batch.execute()
+    
+    return messages
+
+
+def extract_headers(msg: dict) -> dict[str, str]:
+    """Map lower-cased header names to values for a fetched Gmail message."""
+    return {h["name"].lower(): h["value"] for h in msg.get("payload", {}).get("headers", [])}